@@ -0,0 +1,143 @@
+import sqlite3
+import threading
+import orjson
+import os
+from .data_generator import DATA_DIR
+
+# One row per case, so a create/update/delete touches only that case
+CASES_DB_FILE = os.path.join(DATA_DIR, "cases.db")
+# Cases were previously kept in a single JSON file; it is imported once and left in place
+LEGACY_CASES_FILE = os.path.join(DATA_DIR, "cases.json")
+
+CASE_COLUMNS = ["case_id", "node_id", "status", "severity", "created_at", "initial_notes", "analyst_updates", "risk_score"]
+
+# One connection per worker process, opened on first use (i.e. after gunicorn forks).
+# The functions below block, so async callers run them via asyncio.to_thread
+_conn = None
+_conn_lock = threading.Lock()
+
+def _get_connection():
+    global _conn
+    if _conn is None:
+        conn = sqlite3.connect(CASES_DB_FILE, check_same_thread=False, isolation_level=None)
+        # WAL lets the other workers read while one of them writes
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS cases (
+                case_id TEXT PRIMARY KEY,
+                node_id INTEGER,
+                status TEXT,
+                severity TEXT,
+                created_at TEXT,
+                initial_notes TEXT,
+                analyst_updates JSON,
+                risk_score REAL
+            )
+        """)
+        _import_legacy_cases(conn)
+        _conn = conn
+    return _conn
+
+# PRAGMA user_version once the legacy cases.json has been imported (or found absent)
+_LEGACY_IMPORTED_VERSION = 1
+
+def _import_legacy_cases(conn):
+    """
+    Copies the cases from the old cases.json into the table on the database's first use.
+    The import is recorded in the database, so deleted cases never come back from the file.
+    """
+    if conn.execute("PRAGMA user_version").fetchone()[0] >= _LEGACY_IMPORTED_VERSION:
+        return
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        # Another worker may have imported them while this one waited for the lock
+        if conn.execute("PRAGMA user_version").fetchone()[0] < _LEGACY_IMPORTED_VERSION:
+            if os.path.exists(LEGACY_CASES_FILE):
+                with open(LEGACY_CASES_FILE, 'rb') as f:
+                    legacy_cases = orjson.loads(f.read())
+                conn.executemany(
+                    "INSERT OR IGNORE INTO cases VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    [_case_to_row(case) for case in legacy_cases.values()]
+                )
+            conn.execute(f"PRAGMA user_version = {_LEGACY_IMPORTED_VERSION}")
+        conn.execute("COMMIT")
+    except:
+        conn.execute("ROLLBACK")
+        raise
+
+def _case_to_row(case):
+    return (
+        str(case["case_id"]),
+        int(case["node_id"]),
+        case["status"],
+        case["severity"],
+        case["created_at"],
+        case["initial_notes"],
+        orjson.dumps(case.get("analyst_updates", [])).decode(),
+        float(case["risk_score"]),
+    )
+
+def _row_to_case(row):
+    case = dict(zip(CASE_COLUMNS, row))
+    case["analyst_updates"] = orjson.loads(case["analyst_updates"])
+    return case
+
+def get_all_cases():
+    """
+    Returns every case as {case_id: case}, in creation order.
+    """
+    with _conn_lock:
+        rows = _get_connection().execute(
+            f"SELECT {', '.join(CASE_COLUMNS)} FROM cases ORDER BY rowid"
+        ).fetchall()
+    return {row[0]: _row_to_case(row) for row in rows}
+
+def insert_case(case):
+    """
+    Stores a new case. Returns False (and stores nothing) if its case_id already exists.
+    """
+    with _conn_lock:
+        try:
+            _get_connection().execute(
+                "INSERT INTO cases VALUES (?, ?, ?, ?, ?, ?, ?, ?)", _case_to_row(case)
+            )
+        except sqlite3.IntegrityError:
+            return False
+    return True
+
+def update_case_status(case_id, status, timestamp, note):
+    """
+    Sets a case's status and appends the change to its analyst_updates log.
+    Returns the case's node_id, or None if there is no such case.
+    """
+    with _conn_lock:
+        conn = _get_connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Column references on the right-hand side see the row before the update,
+            # so from_status is the previous status
+            cursor = conn.execute("""
+                UPDATE cases SET
+                    analyst_updates = json_insert(analyst_updates, '$[#]', json_object(
+                        'timestamp', ?, 'from_status', status, 'to_status', ?, 'note', ?
+                    )),
+                    status = ?
+                WHERE case_id = ?
+            """, (timestamp, status, note, status, case_id))
+            node_id = None
+            if cursor.rowcount:
+                node_id = conn.execute("SELECT node_id FROM cases WHERE case_id = ?", (case_id,)).fetchone()[0]
+            conn.execute("COMMIT")
+        except:
+            conn.execute("ROLLBACK")
+            raise
+    return node_id
+
+def delete_case(case_id):
+    """
+    Deletes a case. Returns False if there is no such case.
+    """
+    with _conn_lock:
+        cursor = _get_connection().execute("DELETE FROM cases WHERE case_id = ?", (case_id,))
+    return cursor.rowcount > 0
@@ -1,12 +1,28 @@
 import pandas as pd
 import numpy as np
 import os
+import json
+import hashlib
 from datetime import datetime, timedelta
-import random
+
+# Optional: Arrow's C++ CSV writer is much faster than DataFrame.to_csv
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+except ImportError:
+    pa = None
 
 # Configuration
 NUM_FEATURES = 16
 
+# Transaction categories, stored as categorical codes in the generated data
+TRANSACTION_TYPES = ['ring_internal', 'laundering', 'normal']
+
+# Nanoseconds per time unit, for building int64 timestamps
+NS_PER_MINUTE = 60 * 1_000_000_000
+NS_PER_HOUR = 60 * NS_PER_MINUTE
+NS_PER_DAY = 24 * NS_PER_HOUR
+
 # Create a directory for data if it doesn't exist
 DATA_DIR = "./data"
 if not os.path.exists(DATA_DIR):
@@ -14,16 +30,162 @@ if not os.path.exists(DATA_DIR):
 
 NODES_FILE = os.path.join(DATA_DIR, "nodes.csv")
 TRANSACTIONS_FILE = os.path.join(DATA_DIR, "transactions.csv")
+META_FILE = os.path.join(DATA_DIR, ".meta.json")
+LABEL_OVERRIDES_FILE = os.path.join(DATA_DIR, "label_overrides.jsonl")
+
+def write_csv(df, path):
+    """
+    Writes a DataFrame to CSV without its index, using pyarrow when it is installed.
+    """
+    if pa is None:
+        df.to_csv(path, index=False)
+        return
+    pacsv.write_csv(pa.Table.from_pandas(df, preserve_index=False), path)
+
+def read_csv(path, columns=None, dtype=None):
+    """
+    Reads a CSV into a DataFrame, parsing only `columns` (all if None) with pyarrow
+    when it is installed. `dtype` maps column names to NumPy types, or str for text.
+    """
+    if pa is None:
+        return pd.read_csv(path, usecols=columns, dtype=dtype)
+    # Arrow parses with the given types directly; through pd.read_csv's pyarrow engine,
+    # dtype is only applied after Arrow's own inference (which turns timestamps into datetimes)
+    column_types = {
+        name: pa.string() if t is str else pa.from_numpy_dtype(t)
+        for name, t in (dtype or {}).items()
+    }
+    convert_options = pacsv.ConvertOptions(column_types=column_types)
+    if columns is not None:
+        convert_options.include_columns = list(columns)
+    return pacsv.read_csv(path, convert_options=convert_options).to_pandas()
+
+def append_label_override(node_id, label):
+    """
+    Records an analyst-assigned label for node_id in the append-only overrides log,
+    so a single label change never rewrites NODES_FILE.
+    """
+    line = json.dumps({"node_id": int(node_id), "label": int(label), "ts": datetime.now().isoformat()})
+    with open(LABEL_OVERRIDES_FILE, 'a') as f:
+        f.write(line + '\n')
+
+def apply_label_overrides():
+    """
+    Folds the logged label overrides into NODES_FILE (the latest label per node wins)
+    and clears the log. Returns the number of nodes whose label was set.
+    """
+    pending = LABEL_OVERRIDES_FILE + ".applying"
+    # Move the log aside first, so overrides appended meanwhile start a new one. It goes to a
+    # per-process name (workers may train concurrently) and is then appended to `pending`, which
+    # still holds the labels of an earlier apply that failed, ahead of the newer ones
+    taken = f"{LABEL_OVERRIDES_FILE}.{os.getpid()}"
+    try:
+        os.replace(LABEL_OVERRIDES_FILE, taken)
+    except FileNotFoundError:
+        pass  # nothing logged since the last apply, or another worker took it
+    else:
+        with open(taken, 'r') as src, open(pending, 'a') as dst:
+            dst.write(src.read())
+        os.remove(taken)
+    
+    labels = {}
+    try:
+        with open(pending, 'r') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                # Skip damaged lines (e.g. an append cut short by a crash) rather than
+                # failing every retry on them
+                try:
+                    override = json.loads(line)
+                    labels[int(override['node_id'])] = int(override['label'])
+                except (ValueError, KeyError, TypeError) as e:
+                    print(f"Skipping malformed label override {line.strip()!r}: {e}")
+    except FileNotFoundError:
+        return 0
+    
+    num_updated = 0
+    if labels and os.path.exists(NODES_FILE):
+        nodes_df = read_csv(NODES_FILE)
+        rows = pd.Index(nodes_df['node_id']).get_indexer(list(labels.keys()))
+        found = rows >= 0
+        is_fraud = nodes_df['is_fraud'].to_numpy(copy=True)
+        is_fraud[rows[found]] = np.fromiter(labels.values(), dtype=is_fraud.dtype, count=len(labels))[found]
+        nodes_df['is_fraud'] = is_fraud
+        write_csv(nodes_df, NODES_FILE)
+        num_updated = int(found.sum())
+    # Dropped only once NODES_FILE has the labels, so a failed apply is retried by the next one
+    try:
+        os.remove(pending)
+    except FileNotFoundError:
+        pass
+    return num_updated
+
+def pair_sample_no_replace(pool, n, rng):
+    """
+    Draws n (sender, receiver) pairs from pool with sender != receiver in every pair.
+    """
+    a = rng.integers(0, len(pool), n)
+    b = rng.integers(0, len(pool) - 1, n)
+    # Shift receivers at or above the sender up by one so they never collide
+    b += (b >= a)
+    return pool[a], pool[b]
+
+def dataset_cache_key(seed, num_nodes, num_transactions, fraud_node_percentage):
+    """
+    Short hash identifying the dataset produced by a given seed and config.
+    """
+    params = json.dumps([seed, num_nodes, num_transactions, fraud_node_percentage, NUM_FEATURES])
+    return hashlib.sha256(params.encode()).hexdigest()[:16]
 
-def generate_synthetic_data():
+def load_cached_stats(cache_key):
+    """
+    Returns the stats saved with the current CSVs if they were generated for cache_key
+    and have not been modified since, otherwise None.
+    """
+    if not os.path.exists(META_FILE):
+        return None
+    try:
+        with open(META_FILE, 'r') as f:
+            meta = json.load(f)
+        if meta.get('cache_key') != cache_key:
+            return None
+        for path in (NODES_FILE, TRANSACTIONS_FILE):
+            if os.stat(path).st_mtime_ns != meta['mtimes'].get(path):
+                return None
+        return meta['stats']
+    except (OSError, ValueError, KeyError):
+        return None
+
+def save_cache_meta(cache_key, stats):
+    meta = {
+        'cache_key': cache_key,
+        'mtimes': {path: os.stat(path).st_mtime_ns for path in (NODES_FILE, TRANSACTIONS_FILE)},
+        'stats': stats
+    }
+    with open(META_FILE, 'w') as f:
+        json.dump(meta, f)
+
+def generate_synthetic_data(seed=None):
     """
     Generates and saves a synthetic dataset of nodes and transactions with temporal information.
+    The same seed always produces the same dataset, so if the CSVs on disk were generated
+    from it (and left untouched) they are reused instead of being regenerated.
     """
     
+    if seed is None:
+        seed = int(np.random.SeedSequence().generate_state(1)[0])
+    rng = np.random.default_rng(seed)
+    
     # Randomized config
-    NUM_NODES = random.randint(800, 1500)
-    NUM_TRANSACTIONS = random.randint(4000, 7000)
-    FRAUD_NODE_PERCENTAGE = random.uniform(0.04, 0.10)
+    NUM_NODES = int(rng.integers(800, 1501))
+    NUM_TRANSACTIONS = int(rng.integers(4000, 7001))
+    FRAUD_NODE_PERCENTAGE = float(rng.uniform(0.04, 0.10))
+    
+    cache_key = dataset_cache_key(seed, NUM_NODES, NUM_TRANSACTIONS, FRAUD_NODE_PERCENTAGE)
+    cached_stats = load_cached_stats(cache_key)
+    if cached_stats is not None:
+        return cached_stats
 
     # 1. Generate Nodes
     num_fraud_nodes = int(NUM_NODES * FRAUD_NODE_PERCENTAGE)
@@ -31,32 +193,65 @@ def generate_synthetic_data():
     
     node_ids = np.arange(NUM_NODES)
     is_fraud = np.zeros(NUM_NODES, dtype=int)
-    fraud_node_indices = np.random.choice(node_ids, num_fraud_nodes, replace=False)
+    fraud_node_indices = rng.choice(node_ids, num_fraud_nodes, replace=False)
+    normal_node_indices = np.setdiff1d(node_ids, fraud_node_indices, assume_unique=True)
     is_fraud[fraud_node_indices] = 1
     
-    # Generate random features
-    features = np.random.rand(NUM_NODES, NUM_FEATURES)
+    # Generate random features (float32, filled in place)
+    features = np.empty((NUM_NODES, NUM_FEATURES), dtype=np.float32)
+    rng.random(dtype=np.float32, out=features)
     
-    # Inject a signal for fraud nodes
+    # Inject a signal for fraud nodes: uniform(0.5, 1.0) boost on the first 3 features
     if num_fraud_nodes > 0:
-        features[fraud_node_indices, 0:3] += np.random.uniform(0.5, 1.0, (num_fraud_nodes, 3))
+        boost = rng.random((num_fraud_nodes, 3), dtype=np.float32)
+        boost *= 0.5
+        boost += 0.5
+        features[fraud_node_indices, 0:3] += boost
     
     nodes_df = pd.DataFrame(features, columns=[f'feature_{i}' for i in range(NUM_FEATURES)])
     nodes_df['node_id'] = node_ids
     nodes_df['is_fraud'] = is_fraud
     
     # 2. Generate Transactions (Edges) with TEMPORAL DATA
-    senders = []
-    receivers = []
-    amounts = []
-    timestamps = []
-    is_fraud_transaction = []
-    transaction_types = []  # New: type of transaction
-    
-    normal_node_indices = np.where(is_fraud == 0)[0]
+    # Each category is drawn as one batch of NumPy arrays and written into
+    # preallocated column arrays; NUM_TRANSACTIONS is an upper bound on the total
+    senders = np.empty(NUM_TRANSACTIONS, dtype=np.int32)
+    receivers = np.empty(NUM_TRANSACTIONS, dtype=np.int32)
+    amounts = np.empty(NUM_TRANSACTIONS, dtype=np.float64)
+    timestamps = np.empty(NUM_TRANSACTIONS, dtype=np.int64)
+    time_steps = np.empty(NUM_TRANSACTIONS, dtype=np.int64)
+    is_fraud_transaction = np.empty(NUM_TRANSACTIONS, dtype=np.int8)
+    transaction_types = np.empty(NUM_TRANSACTIONS, dtype=np.int8)  # New: type of transaction (code into TRANSACTION_TYPES)
+    num_written = 0
     
     # Set time range (100 days)
     start_time = datetime.now() - timedelta(days=100)
+    start_ns = np.int64(pd.Timestamp(start_time).value)
+    
+    def batch_timestamps(first_day, last_day, n):
+        """Returns (days_offset, timestamps in int64 nanoseconds) for n transactions."""
+        # Day offsets are inclusive of last_day
+        days_offset = rng.integers(first_day, last_day + 1, n, dtype=np.int64)
+        hours = rng.integers(0, 24, n, dtype=np.int64)
+        minutes = rng.integers(0, 60, n, dtype=np.int64)
+        ts_ns = (start_ns
+                 + days_offset * NS_PER_DAY
+                 + hours * NS_PER_HOUR
+                 + minutes * NS_PER_MINUTE)
+        return days_offset, ts_ns
+    
+    def add_batch(batch_senders, batch_receivers, batch_amounts, batch_times, fraud_flag, tx_type):
+        nonlocal num_written
+        days_offset, ts_ns = batch_times
+        batch = slice(num_written, num_written + len(batch_senders))
+        senders[batch] = batch_senders
+        receivers[batch] = batch_receivers
+        amounts[batch] = batch_amounts
+        timestamps[batch] = ts_ns
+        time_steps[batch] = days_offset
+        is_fraud_transaction[batch] = fraud_flag
+        transaction_types[batch] = TRANSACTION_TYPES.index(tx_type)
+        num_written = batch.stop
     
     # Create fraud rings (dense subgraphs) - THEY FORM GRADUALLY
     num_fraud_rings = 5
@@ -68,101 +263,93 @@ def generate_synthetic_data():
         
     num_ring_transactions = int(NUM_TRANSACTIONS * 0.2)
     
+    # Each ring "activates" at a specific time (drawn for all rings at once)
+    ring_activation_days = rng.integers(30, 71, num_fraud_rings)
+    ring_durations = rng.integers(10, 26, num_fraud_rings)
+    
     # Fraud rings emerge between day 30-90 (temporal pattern!)
-    for i in range(num_fraud_rings):
-        ring_nodes = fraud_node_indices[i*ring_size : (i+1)*ring_size]
-        if len(ring_nodes) < 2:
-            continue
-        
-        # This ring "activates" at a specific time
-        ring_activation_day = random.randint(30, 70)
-        ring_duration = random.randint(10, 25)
+    # All rings have ring_size members, so every ring is built in one batch:
+    # row r of ring_members is ring r, and ring_of_tx says which ring each transaction belongs to
+    if ring_size >= 2:
+        ring_members = fraud_node_indices[:num_fraud_rings * ring_size].reshape(num_fraud_rings, ring_size)
+        ring_of_tx = np.repeat(np.arange(num_fraud_rings), num_ring_transactions // num_fraud_rings)
+        n = len(ring_of_tx)
+        local_senders, local_receivers = pair_sample_no_replace(np.arange(ring_size), n, rng)
         
-        for _ in range(num_ring_transactions // num_fraud_rings):
-            sender, receiver = np.random.choice(ring_nodes, 2, replace=False)
-            # Fraud transactions happen AFTER activation
-            days_offset = random.randint(ring_activation_day, ring_activation_day + ring_duration)
-            timestamp = start_time + timedelta(
-                days=days_offset,
-                hours=random.randint(0, 23),
-                minutes=random.randint(0, 59)
-            )
-            
-            senders.append(sender)
-            receivers.append(receiver)
-            amounts.append(np.random.uniform(500, 2000))
-            timestamps.append(timestamp)
-            is_fraud_transaction.append(1)
-            transaction_types.append('ring_internal')
+        # Fraud transactions happen AFTER activation
+        activation_day = ring_activation_days[ring_of_tx]
+        add_batch(
+            ring_members[ring_of_tx, local_senders],
+            ring_members[ring_of_tx, local_receivers],
+            rng.uniform(500, 2000, n),
+            batch_timestamps(activation_day, activation_day + ring_durations[ring_of_tx], n),
+            1,
+            'ring_internal'
+        )
 
     # Create 'laundering' transactions (fraud -> normal) - LATE STAGE
     num_laundering_transactions = int(NUM_TRANSACTIONS * 0.1)
     if num_fraud_nodes > 0 and len(normal_node_indices) > 0:
-        for _ in range(num_laundering_transactions):
-            # Laundering happens in days 60-100 (after rings are established)
-            days_offset = random.randint(60, 100)
-            timestamp = start_time + timedelta(
-                days=days_offset,
-                hours=random.randint(0, 23),
-                minutes=random.randint(0, 59)
-            )
-            
-            senders.append(np.random.choice(fraud_node_indices))
-            receivers.append(np.random.choice(normal_node_indices))
-            amounts.append(np.random.uniform(100, 1000))
-            timestamps.append(timestamp)
-            is_fraud_transaction.append(1)
-            transaction_types.append('laundering')
+        # Laundering happens in days 60-100 (after rings are established)
+        n = num_laundering_transactions
+        add_batch(
+            rng.choice(fraud_node_indices, size=n),
+            rng.choice(normal_node_indices, size=n),
+            rng.uniform(100, 1000, n),
+            batch_timestamps(60, 100, n),
+            1,
+            'laundering'
+        )
 
     # Create normal transactions - DISTRIBUTED THROUGHOUT
-    num_normal_transactions = NUM_TRANSACTIONS - len(senders)
+    num_normal_transactions = NUM_TRANSACTIONS - num_written
     if len(normal_node_indices) > 1:
-        for _ in range(num_normal_transactions):
-            sender, receiver = np.random.choice(normal_node_indices, 2, replace=False)
-            # Normal transactions happen uniformly across all 100 days
-            days_offset = random.randint(0, 100)
-            timestamp = start_time + timedelta(
-                days=days_offset,
-                hours=random.randint(0, 23),
-                minutes=random.randint(0, 59)
-            )
-            
-            senders.append(sender)
-            receivers.append(receiver)
-            amounts.append(np.random.uniform(10, 200))
-            timestamps.append(timestamp)
-            is_fraud_transaction.append(0)
-            transaction_types.append('normal')
+        n = num_normal_transactions
+        normal_senders, normal_receivers = pair_sample_no_replace(normal_node_indices, n, rng)
         
+        # Normal transactions happen uniformly across all 100 days
+        add_batch(
+            normal_senders,
+            normal_receivers,
+            rng.uniform(10, 200, n),
+            batch_timestamps(0, 100, n),
+            0,
+            'normal'
+        )
+        
+    # Sort by timestamp for temporal analysis (on the int64 column, before building the DataFrame)
+    order = np.argsort(timestamps[:num_written], kind='stable')
     transactions_df = pd.DataFrame({
-        'sender_id': senders,
-        'receiver_id': receivers,
-        'amount': amounts,
-        'timestamp': timestamps,
-        'is_fraud_transaction': is_fraud_transaction,
-        'transaction_type': transaction_types
+        'sender_id': senders[order],
+        'receiver_id': receivers[order],
+        'amount': amounts[order],
+        'timestamp': pd.to_datetime(timestamps[order], unit='ns'),
+        'is_fraud_transaction': is_fraud_transaction[order],
+        'transaction_type': pd.Categorical.from_codes(transaction_types[order], categories=TRANSACTION_TYPES),
+        # time_step (0-100 for easy slider usage) is the day the transaction happened on
+        'time_step': np.clip(time_steps[order], 0, 100)
     })
     
-    # Sort by timestamp for temporal analysis
-    transactions_df = transactions_df.sort_values('timestamp').reset_index(drop=True)
-    
-    # Add time_step (0-100 for easy slider usage)
-    min_time = transactions_df['timestamp'].min()
-    max_time = transactions_df['timestamp'].max()
-    transactions_df['time_step'] = ((transactions_df['timestamp'] - min_time) / 
-                                     (max_time - min_time) * 100).astype(int)
-    
     # Save to CSV
-    nodes_df.to_csv(NODES_FILE, index=False)
-    transactions_df.to_csv(TRANSACTIONS_FILE, index=False)
+    write_csv(nodes_df, NODES_FILE)
+    write_csv(transactions_df, TRANSACTIONS_FILE)
     
-    return {
+    # Pending overrides refer to the previous dataset's nodes
+    for overrides_file in (LABEL_OVERRIDES_FILE, LABEL_OVERRIDES_FILE + ".applying"):
+        if os.path.exists(overrides_file):
+            os.remove(overrides_file)
+    
+    stats = {
         "nodes": NUM_NODES,
         "transactions": len(transactions_df),
         "fraudulent_nodes": num_fraud_nodes,
         "time_range_days": 100,
-        "fraud_rings": num_fraud_rings
+        "fraud_rings": num_fraud_rings,
+        "seed": seed
     }
+    save_cache_meta(cache_key, stats)
+    
+    return stats
 
 if __name__ == "__main__":
     stats = generate_synthetic_data()
@@ -2,12 +2,11 @@ import torch
 import torch.nn.functional as F
 from torch_geometric.nn import SAGEConv
 from torch_geometric.data import Data
-from torch_geometric.utils import to_networkx
-import networkx as nx
 from sklearn.metrics import precision_score, recall_score, roc_auc_score, f1_score, accuracy_score, confusion_matrix
-import pandas as pd
 import numpy as np
-import json
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+import orjson
 import os
 import pickle
 
@@ -17,12 +16,18 @@ try:
 except ImportError:
     pass 
 
-from .data_generator import NODES_FILE, TRANSACTIONS_FILE, DATA_DIR
+from .data_generator import NODES_FILE, TRANSACTIONS_FILE, DATA_DIR, NUM_FEATURES, read_csv, apply_label_overrides
 
 PREDICTIONS_FILE = os.path.join(DATA_DIR, "predictions.json")
 MODEL_FILE = os.path.join(DATA_DIR, "trained_model.pt")
 DATA_FILE = os.path.join(DATA_DIR, "graph_data.pt")
 
+# Opt-in: compiling costs more than it saves for a single 100-epoch run on a small graph
+TORCH_COMPILE = os.environ.get("GNN_TORCH_COMPILE") == "1"
+
+# CSR neighbor index of the saved graph: (DATA_FILE mtime, rowptr, col)
+_neighbor_index = None
+
 def clear_saved_models():
     """Remove old model files to force clean retrain"""
     for file in [MODEL_FILE, DATA_FILE, PREDICTIONS_FILE]:
@@ -48,12 +53,18 @@ class GraphSAGEModel(torch.nn.Module):
 
 def load_data():
     if not os.path.exists(NODES_FILE): return None
-    nodes_df = pd.read_csv(NODES_FILE)
-    transactions_df = pd.read_csv(TRANSACTIONS_FILE)
+    # Only parse the columns needed for training
+    feature_cols = [f'feature_{i}' for i in range(NUM_FEATURES)]
+    nodes_df = read_csv(NODES_FILE, columns=feature_cols + ['is_fraud'])
+    transactions_df = read_csv(TRANSACTIONS_FILE, columns=['sender_id', 'receiver_id'])
 
-    x = torch.tensor(nodes_df[[c for c in nodes_df.columns if 'feature_' in c]].values, dtype=torch.float)
-    y = torch.tensor(nodes_df['is_fraud'].values, dtype=torch.long)
-    edge_index = torch.tensor(transactions_df[['sender_id', 'receiver_id']].values.T, dtype=torch.long)
+    # Convert straight to the tensor dtypes in NumPy so torch.from_numpy can share the memory.
+    # copy=True for y: an int64 column would otherwise come back as a read-only view of the frame
+    x = torch.from_numpy(np.ascontiguousarray(nodes_df[feature_cols].to_numpy(dtype=np.float32)))
+    y = torch.from_numpy(nodes_df['is_fraud'].to_numpy(dtype=np.int64, copy=True))
+    edge_index = torch.from_numpy(np.ascontiguousarray(
+        transactions_df[['sender_id', 'receiver_id']].to_numpy(dtype=np.int64).T
+    ))
 
     data = Data(x=x, y=y, edge_index=edge_index)
     
@@ -76,18 +87,43 @@ def save_model_and_data(model, data):
     
     # Save data object with pickle protocol enabled
     # Move data to CPU before saving to avoid device issues
+    # Pickle protocol 5 (the newest); tensor storages are written as separate zip records either way
     data_cpu = data.cpu()
-    torch.save(data_cpu, DATA_FILE, pickle_protocol=4)
+    torch.save(data_cpu, DATA_FILE, pickle_protocol=5)
+
+def build_neighbor_index(data):
+    """
+    Builds a CSR view of data.edge_index: the outgoing neighbors of node n
+    are col[rowptr[n]:rowptr[n+1]], in their original edge order.
+    """
+    src = data.edge_index[0].cpu().numpy()
+    dst = data.edge_index[1].cpu().numpy()
+    order = np.argsort(src, kind='stable')
+    col = dst[order]
+    rowptr = np.searchsorted(src[order], np.arange(data.num_nodes + 1))
+    return rowptr, col
 
 def load_model_and_data():
     """
     Loads the model and data.
     CRITICAL FIX: weights_only=False is required for PyTorch 2.6+ when loading PyG Data objects
     """
+    model, data, _ = load_model_data_and_index()
+    return model, data
+
+def load_model_data_and_index():
+    """
+    Like load_model_and_data, but also returns the (rowptr, col) neighbor index
+    built from that same data.
+    """
     if not os.path.exists(MODEL_FILE) or not os.path.exists(DATA_FILE):
-        return None, None
+        return None, None, None
     
     try:
+        # Stat before loading: if a retrain rewrites the file in between, the index built
+        # below is filed under the older mtime and rebuilt on the next call
+        data_mtime = os.stat(DATA_FILE).st_mtime_ns
+        
         # FIX 1: Allow loading the Graph Data object (PyTorch Geometric Data class)
         # This is safe because we generated this file ourselves
         # We need to use weights_only=False AND map_location to avoid device issues
@@ -97,6 +133,14 @@ def load_model_and_data():
             weights_only=False
         )
         
+        # Rebuild the neighbor index only when the saved graph changes
+        global _neighbor_index
+        cached_index = _neighbor_index
+        if cached_index is None or cached_index[0] != data_mtime:
+            cached_index = (data_mtime, *build_neighbor_index(data))
+            _neighbor_index = cached_index
+        neighbor_index = cached_index[1:]
+        
         # Create model architecture
         model = GraphSAGEModel(
             in_channels=data.num_node_features, 
@@ -113,15 +157,46 @@ def load_model_and_data():
         model.load_state_dict(state_dict)
         model.eval()
         
-        return model, data
+        return model, data, neighbor_index
         
     except Exception as e:
         print(f"Error loading model/data: {e}")
         import traceback
         traceback.print_exc()
-        return None, None
+        return None, None, None
+
+def detect_rings(edge_index, fraud_idx, num_nodes):
+    """
+    Returns the connected components (as arrays of node ids) of the undirected
+    subgraph induced by fraud_idx. Isolated fraud nodes form their own component.
+    """
+    if len(fraud_idx) == 0:
+        return []
+    
+    # Keep only edges whose endpoints are both predicted fraud
+    is_fraud_node = np.zeros(num_nodes, dtype=bool)
+    is_fraud_node[fraud_idx] = True
+    src, dst = edge_index
+    in_subgraph = is_fraud_node[src] & is_fraud_node[dst]
+    adjacency = coo_matrix(
+        (np.ones(int(in_subgraph.sum())), (src[in_subgraph], dst[in_subgraph])),
+        shape=(num_nodes, num_nodes)
+    ).tocsr()
+    _, labels = connected_components(adjacency, directed=False)
+    
+    # Group fraud nodes by component label
+    _, ring_of_node = np.unique(labels[fraud_idx], return_inverse=True)
+    order = np.argsort(ring_of_node, kind='stable')
+    boundaries = np.flatnonzero(np.diff(ring_of_node[order])) + 1
+    return np.split(fraud_idx[order], boundaries)
 
 def train_and_evaluate():
+    # Train on the analyst labels recorded since the last run. Done before clearing the
+    # old model, so a failure here leaves the working model in place
+    num_overrides = apply_label_overrides()
+    if num_overrides:
+        print(f"Active Learning: applied {num_overrides} label override(s)")
+    
     # Clear any old model files first
     clear_saved_models()
     
@@ -134,15 +209,30 @@ def train_and_evaluate():
     optimizer = torch.optim.Adam(model.parameters(), lr=0.01)
 
     model.train()
+    
+    # Optionally compile the training forward pass (PyTorch 2.0+, GNN_TORCH_COMPILE=1).
+    # Every run compiles a fresh model, so this only pays off for larger graphs or longer
+    # training; CUDA graphs ('reduce-overhead') only help on the GPU.
+    # The original module is kept for eval and saving (its state_dict keys are unprefixed)
+    train_forward = model
+    if TORCH_COMPILE and hasattr(torch, 'compile'):
+        try:
+            mode = 'reduce-overhead' if device.type == 'cuda' else 'default'
+            train_forward = torch.compile(model, mode=mode)
+            train_forward(data.x, data.edge_index)  # Warm-up: triggers compilation
+        except Exception as e:
+            print(f"torch.compile failed, training in eager mode: {e}")
+            train_forward = model
+    
     for _ in range(100):
         optimizer.zero_grad()
-        out = model(data.x, data.edge_index)
+        out = train_forward(data.x, data.edge_index)
         loss = F.nll_loss(out[data.train_mask], data.y[data.train_mask])
         loss.backward()
         optimizer.step()
 
     model.eval()
-    with torch.no_grad():
+    with torch.inference_mode():
         out = model(data.x, data.edge_index)
         pred = out.argmax(dim=1)
         
@@ -158,17 +248,15 @@ def train_and_evaluate():
         fraud_idx = np.where(all_preds == 1)[0]
         
         # Detect Rings
-        G = to_networkx(data, to_undirected=True)
-        subgraph = G.subgraph(fraud_idx)
-        rings = list(nx.connected_components(subgraph))
-        nodes_in_rings = set().union(*rings) if rings else set()
+        rings = detect_rings(data.edge_index.cpu().numpy(), fraud_idx, data.num_nodes)
+        nodes_in_rings = np.concatenate(rings) if rings else np.empty(0, dtype=np.int64)
         
-        # Convert numpy types to Python native types for JSON serialization
-        with open(PREDICTIONS_FILE, 'w') as f:
-            json.dump({
-                'predictions': [int(x) for x in all_preds.tolist()],  # Convert to Python int
-                'nodes_in_rings': [int(x) for x in nodes_in_rings]    # Convert to Python int
-            }, f)
+        # orjson serializes the NumPy arrays directly, no per-element int() conversion
+        with open(PREDICTIONS_FILE, 'wb') as f:
+            f.write(orjson.dumps({
+                'predictions': all_preds.astype(np.int32),
+                'nodes_in_rings': nodes_in_rings.astype(np.int32)
+            }, option=orjson.OPT_SERIALIZE_NUMPY))
         
         save_model_and_data(model, data)
         
@@ -178,7 +266,7 @@ def train_and_evaluate():
             "recall": float(recall_score(y_true, y_pred, zero_division=0)),
             "f1_score": float(f1_score(y_true, y_pred, zero_division=0)),
             "accuracy": float(accuracy_score(y_true, y_pred)),
-            "auc": float(roc_auc_score(y_true, out[data.test_mask].exp()[:,1].cpu().numpy())) if len(np.unique(y_true))>1 else 0.0,
+            "auc": float(roc_auc_score(y_true, out[data.test_mask, 1].exp().cpu().numpy())) if len(np.unique(y_true))>1 else 0.0,
             "fraud_ring_count": int(len(rings)),
             "confusion_matrix": {
                 "tp": int(tp), 
@@ -192,7 +280,7 @@ def explain_node_prediction(node_id: int):
     """
     Simplified explainer for demo - returns feature importance and neighbor info
     """
-    model, data = load_model_and_data()
+    model, data, neighbor_index = load_model_data_and_index()
     if not model: 
         raise Exception("Model not trained")
     
@@ -201,18 +289,21 @@ def explain_node_prediction(node_id: int):
         raise ValueError(f"Node ID {node_id} out of range (0-{data.num_nodes-1})")
     
     # Get neighbors
-    neighbors = data.edge_index[1][data.edge_index[0] == node_id].tolist()
+    rowptr, col = neighbor_index
+    neighbors = col[rowptr[node_id]:rowptr[node_id + 1]]
     
     # Get top features (simple magnitude check)
-    features = data.x[node_id].tolist()
-    top_feat_indices = np.argsort(np.abs(features))[-3:][::-1]
+    # argpartition finds the 3 largest in O(n); only those 3 are then sorted
+    abs_features = np.abs(data.x[node_id].numpy())
+    top_k = np.argpartition(abs_features, -3)[-3:]
+    top_feat_indices = top_k[np.argsort(-abs_features[top_k])]
     
     return {
         "node_id": node_id,
         "top_features": [
             {
                 "feature_name": f"feature_{i}", 
-                "importance": abs(features[i])
+                "importance": float(abs_features[i])
             } for i in top_feat_indices
         ],
         "top_neighbors": [
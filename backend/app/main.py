@@ -1,6 +1,7 @@
-from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect, Response
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi import Depends, status
+from fastapi import Depends, Query, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel
 from datetime import datetime, timedelta
@@ -9,28 +10,34 @@ from typing import Optional, List
 import uvicorn
 import pandas as pd
 import json
+import orjson
 from . import data_generator
 from . import gnn_model
+from . import case_store
 from .gnn_model import PREDICTIONS_FILE
 import os
 import asyncio
 import numpy as np
+import torch
 import google.generativeai as genai
 from pydantic import BaseModel
 import random
+import re
+import time
+from functools import lru_cache
 
 from typing import Literal
 
 app = FastAPI(
     title="Fraud Ring Detection API",
     description="Uses a GNN to detect sophisticated fraud rings.",
+    default_response_class=ORJSONResponse,
 )
 
 # ============ AUTHENTICATION SETUP ============
 SECRET_KEY = "your-secret-key-change-in-production-fraud-guard-ai-2024"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_HOURS = 24
-CASES_FILE = os.path.join(data_generator.DATA_DIR, "cases.json")
 
 security = HTTPBearer()
 
@@ -58,10 +65,20 @@ def create_access_token(data: dict) -> str:
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+# The UI sends the same token with every request, so verified payloads are memoized.
+# The time bucket makes each entry live at most 5 seconds; invalid tokens raise and
+# are never cached
+@lru_cache(maxsize=2048)
+def _decode_token(token: str, bucket: int) -> dict:
+    return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+
 def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
     try:
         token = credentials.credentials
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = _decode_token(token, int(time.time() // 5))
+        # A cached payload may have expired since it was verified
+        if payload.get("exp") is not None and payload["exp"] <= time.time():
+            raise jwt.ExpiredSignatureError("Signature has expired")
         email: str = payload.get("sub")
         if email != ADMIN_EMAIL:
             raise HTTPException(
@@ -150,26 +167,212 @@ class ConnectionManager:
         self.active_connections.append(websocket)
 
     def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
+        # May already have been pruned by a failed broadcast
+        if websocket in self.active_connections:
+            self.active_connections.remove(websocket)
 
     async def broadcast(self, message: dict):
-        for connection in self.active_connections:
-            try:
-                await connection.send_json(message)
-            except:
-                pass
+        # Encode once for every client and send to all of them concurrently.
+        # Text frames, since the frontend JSON.parses event.data
+        text = orjson.dumps(message).decode()
+        connections = list(self.active_connections)
+        results = await asyncio.gather(
+            *(connection.send_text(text) for connection in connections),
+            return_exceptions=True
+        )
+        # Drop the connections that failed
+        for connection, result in zip(connections, results):
+            if isinstance(result, Exception):
+                self.disconnect(connection)
 
 manager = ConnectionManager()
 
+# ============ DATA CACHE ============
+# Parsed files are memoized on (path, mtime, size), so they are re-read only after
+# they change on disk. Cached objects are shared between requests: don't mutate them.
+
+# Compact dtypes for the generated CSVs' integer columns instead of pandas' inferred int64.
+# Features and amounts stay float64: the API serves them, and float32 would not print as in the CSV.
+# timestamp stays text (the pyarrow engine would otherwise parse it into datetimes)
+_CSV_DTYPES = {
+    data_generator.NODES_FILE: {
+        'node_id': np.int32,
+        'is_fraud': np.int8,
+    },
+    data_generator.TRANSACTIONS_FILE: {
+        'sender_id': np.int32,
+        'receiver_id': np.int32,
+        'is_fraud_transaction': np.int8,
+        'time_step': np.int16,
+        'timestamp': str,
+    },
+}
+
+@lru_cache(maxsize=8)
+def _read_csv_cached(path: str, mtime_ns: int, size: int, columns: Optional[tuple]) -> pd.DataFrame:
+    # columns=None parses every column. No default, so every caller passes the same
+    # four arguments and shares one lru_cache entry per file version
+    return data_generator.read_csv(path, columns=columns, dtype=_CSV_DTYPES.get(path))
+
+@lru_cache(maxsize=2)
+def _read_json_cached(path: str, mtime_ns: int, size: int) -> dict:
+    with open(path, 'r') as f:
+        return json.load(f)
+
+@lru_cache(maxsize=4)
+def _read_nodes_indexed(path: str, mtime_ns: int, size: int, columns: Optional[tuple] = None) -> pd.DataFrame:
+    # Index by node_id (keeping the column) so single-node lookups are a hash probe
+    return _read_csv_cached(path, mtime_ns, size, columns).set_index('node_id', drop=False)
+
+@lru_cache(maxsize=2)
+def _read_node_stats(path: str, mtime_ns: int, size: int) -> pd.DataFrame:
+    # Per-node transaction aggregates, indexed by node_id. Senders and receivers
+    # always differ, so a node's transactions are its outgoing plus its incoming ones
+    transactions_df = _read_csv_cached(path, mtime_ns, size, ('sender_id', 'receiver_id', 'amount', 'is_fraud_transaction'))
+    agg_out = transactions_df.groupby('sender_id').agg(
+        n_out=('amount', 'size'), total_out=('amount', 'sum'), fraud_count_out=('is_fraud_transaction', 'sum')
+    )
+    agg_in = transactions_df.groupby('receiver_id').agg(
+        n_in=('amount', 'size'), total_in=('amount', 'sum'), fraud_count_in=('is_fraud_transaction', 'sum')
+    )
+    node_stats = agg_out.join(agg_in, how='outer').fillna(0)
+    node_stats.index.name = 'node_id'
+    node_stats['n_total'] = node_stats['n_out'] + node_stats['n_in']
+    node_stats['total_amt'] = node_stats['total_out'] + node_stats['total_in']
+    node_stats['avg_amt'] = node_stats['total_amt'] / node_stats['n_total']
+    node_stats['fraud_count'] = node_stats['fraud_count_out'] + node_stats['fraud_count_in']
+    return node_stats
+
+@lru_cache(maxsize=2)
+def _read_records_json(path: str, mtime_ns: int, size: int, double_precision: int) -> str:
+    # The file as a JSON array of records, floats rounded to double_precision decimals
+    # while encoding (no rounded copy of the frame)
+    return _read_csv_cached(path, mtime_ns, size, None).to_json(orient='records', double_precision=double_precision)
+
+# Node columns the copilot puts into its prompt
+_PROFILE_COLUMNS = ['node_id', 'is_fraud', 'feature_0', 'feature_1', 'feature_2']
+
+@lru_cache(maxsize=2)
+def _read_node_profiles(path: str, mtime_ns: int, size: int):
+    # node_id -> {is_fraud, feature_0..2} as plain Python values, plus the fraud count
+    nodes_df = _read_csv_cached(path, mtime_ns, size, tuple(_PROFILE_COLUMNS))
+    columns = [nodes_df[c].tolist() for c in _PROFILE_COLUMNS[1:]]
+    node_profiles = {
+        node_id: dict(zip(_PROFILE_COLUMNS[1:], values))
+        for node_id, *values in zip(nodes_df['node_id'].tolist(), *columns)
+    }
+    return node_profiles, int(nodes_df['is_fraud'].sum())
+
+FAKE_CITIES = ["Lagos, NG", "Moscow, RU", "New York, USA", "London, UK", "Bangalore, IN"]
+
+@lru_cache(maxsize=4096)
+def _fake_identity(node_id: int):
+    # Mock up "Real World" data (IP, Location) since it's not in the CSV.
+    # Seeded by node_id so it's consistent every time you ask
+    rng = random.Random(node_id)
+    fake_ips = [f"192.168.1.{rng.randint(10,99)}", f"10.0.5.{rng.randint(10,99)}"]
+    node_location = rng.choice(FAKE_CITIES)
+    node_ip = rng.choice(fake_ips)
+    return node_ip, node_location
+
+# Latest (args, result) per reader, path and extra args. Holding the result here means the
+# current version is always served without calling the reader, whatever the lru_caches evicted
+_loaded = {}
+
+async def _load_cached(reader, path: str, *extra):
+    # Parsing blocks, so a miss runs in a worker thread to keep the event loop free
+    s = os.stat(path)
+    args = (path, s.st_mtime_ns, s.st_size, *extra)
+    key = (reader, path, *extra)
+    loaded = _loaded.get(key)
+    if loaded is not None and loaded[0] == args:
+        return loaded[1]
+    result = await asyncio.to_thread(reader, *args)
+    _loaded[key] = (args, result)
+    return result
+
+def _columns_key(columns: Optional[List[str]]) -> Optional[tuple]:
+    return tuple(columns) if columns is not None else None
+
+async def load_nodes(columns: Optional[List[str]] = None) -> pd.DataFrame:
+    return await _load_cached(_read_csv_cached, data_generator.NODES_FILE, _columns_key(columns))
+
+async def load_nodes_indexed(columns: Optional[List[str]] = None) -> pd.DataFrame:
+    return await _load_cached(_read_nodes_indexed, data_generator.NODES_FILE, _columns_key(columns))
+
+async def load_transactions() -> pd.DataFrame:
+    return await _load_cached(_read_csv_cached, data_generator.TRANSACTIONS_FILE, None)
+
+async def load_node_stats() -> pd.DataFrame:
+    return await _load_cached(_read_node_stats, data_generator.TRANSACTIONS_FILE)
+
+async def load_node_profiles():
+    return await _load_cached(_read_node_profiles, data_generator.NODES_FILE)
+
+async def load_predictions() -> dict:
+    return await _load_cached(_read_json_cached, PREDICTIONS_FILE)
+
+# ============ INFERENCE CACHE ============
+# The trained model and its per-node class probabilities, computed once at startup
+# and again after each training run instead of on every request.
+# Each worker process has its own copy, tagged with the checkpoint mtime it was built from
+app.state.model = None
+app.state.data = None
+app.state.probs = None
+app.state.sorted_fraud_probs = None
+app.state.model_mtime = None
+
+def _mtime_or_none(path: str) -> Optional[int]:
+    return os.stat(path).st_mtime_ns if os.path.exists(path) else None
+
+def refresh_inference_cache():
+    model_mtime = _mtime_or_none(gnn_model.MODEL_FILE)
+    model, data = gnn_model.load_model_and_data()
+    probs = None
+    if model is not None and data is not None:
+        with torch.no_grad():
+            out = model(data.x, data.edge_index)
+            probs = out.exp().cpu().numpy()
+    app.state.model = model
+    app.state.data = data
+    app.state.probs = probs
+    # Sorted P(fraud), so "how many nodes score above t" is a binary search
+    app.state.sorted_fraud_probs = np.sort(probs[:, 1]) if probs is not None else None
+    app.state.model_mtime = model_mtime
+
+async def get_inference_probs() -> Optional[np.ndarray]:
+    # Reload if the checkpoint changed since the cache was built (e.g. another worker retrained)
+    if _mtime_or_none(gnn_model.MODEL_FILE) != app.state.model_mtime:
+        await asyncio.to_thread(refresh_inference_cache)
+    return app.state.probs
+
+# Explanations of recently requested nodes, keyed by the checkpoint they were computed from.
+# Shared between requests: don't mutate the returned dicts
+@lru_cache(maxsize=512)
+def _cached_explain(node_id: int, model_mtime: Optional[int]) -> dict:
+    return gnn_model.explain_node_prediction(node_id)
+
+async def explain_node(node_id: int) -> dict:
+    return await asyncio.to_thread(_cached_explain, node_id, _mtime_or_none(gnn_model.MODEL_FILE))
+
+@app.on_event("startup")
+async def load_inference_cache():
+    await asyncio.to_thread(refresh_inference_cache)
+
 # ============ YOUR EXISTING ENDPOINTS ============
 
+# Generation and training rewrite the data and model files, so they must not overlap.
+# This only serializes them within one worker process; workers don't share it
+_PIPELINE_LOCK = asyncio.Lock()
+
 @app.post("/generate_dataset")
-async def api_generate_dataset():
-    try:
-        stats = data_generator.generate_synthetic_data()
-        return stats
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+async def api_generate_dataset(seed: Optional[int] = Query(None, ge=0)):
+    async with _PIPELINE_LOCK:
+        try:
+            stats = await asyncio.to_thread(data_generator.generate_synthetic_data, seed)
+            return stats
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/train_gnn")
 async def api_train_gnn():
@@ -179,11 +382,16 @@ async def api_train_gnn():
             detail="Dataset not found. Please generate the dataset first via POST /generate_dataset"
         )
         
-    try:
-        metrics = gnn_model.train_and_evaluate()
-        return metrics
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error during training: {str(e)}")
+    async with _PIPELINE_LOCK:
+        try:
+            metrics = await asyncio.to_thread(gnn_model.train_and_evaluate)
+            return metrics
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error during training: {str(e)}")
+        finally:
+            # Training replaces (or, on failure, removes) the saved model
+            await asyncio.to_thread(refresh_inference_cache)
+            _cached_explain.cache_clear()
 
 @app.get("/get_dataset")
 async def api_get_dataset():
@@ -194,16 +402,14 @@ async def api_get_dataset():
         )
     
     try:
-        nodes_df = pd.read_csv(data_generator.NODES_FILE)
-        transactions_df = pd.read_csv(data_generator.TRANSACTIONS_FILE)
-        
-        nodes_df = nodes_df.round(4)
-        transactions_df['amount'] = transactions_df['amount'].round(2)
-        
-        return {
-            "nodes": nodes_df.to_dict('records'),
-            "transactions": transactions_df.to_dict('records')
-        }
+        # Serialized once per file version. Features are shown to 4 decimals and
+        # amounts (the only float transaction column) to 2
+        nodes_json, transactions_json = await asyncio.gather(
+            _load_cached(_read_records_json, data_generator.NODES_FILE, 4),
+            _load_cached(_read_records_json, data_generator.TRANSACTIONS_FILE, 2)
+        )
+        body = '{"nodes":' + nodes_json + ',"transactions":' + transactions_json + '}'
+        return Response(content=body, media_type="application/json")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -221,44 +427,70 @@ async def api_get_graph_data():
         )
 
     try:
-        nodes_df = pd.read_csv(data_generator.NODES_FILE)
-        transactions_df = pd.read_csv(data_generator.TRANSACTIONS_FILE)
+        nodes_df = await load_nodes()
+        transactions_df = await load_transactions()
         
-        with open(PREDICTIONS_FILE, 'r') as f:
-            predictions_data = json.load(f)
+        predictions_data = await load_predictions()
         
         preds = predictions_data['predictions']
-        ring_nodes = set(predictions_data['nodes_in_rings'])
-        
-        graph_nodes = []
-        for _, row in nodes_df.iterrows():
-            node_id = int(row['node_id'])
-            features = {k: v for k, v in row.items() if k not in ['node_id', 'is_fraud']}
-            
-            graph_nodes.append({
+        # Ring membership as a boolean mask over node ids (predictions are indexed the same way)
+        ring_mask = np.zeros(len(preds), dtype=bool)
+        ring_mask[np.asarray(predictions_data['nodes_in_rings'], dtype=np.int64)] = True
+        
+        # Pull each column out once as a Python list (.tolist() converts in C),
+        # then zip the columns into records instead of iterating DataFrame rows
+        feature_cols = [c for c in nodes_df.columns if c not in ('node_id', 'is_fraud')]
+        node_ids = nodes_df['node_id'].to_numpy(np.int64)
+        graph_nodes = [
+            {
                 "id": node_id,
-                "is_fraud_actual": int(row['is_fraud']),
+                "is_fraud_actual": is_fraud,
                 "is_fraud_predicted": preds[node_id],
-                "is_in_ring": node_id in ring_nodes,
-                "features": features
-            })
-            
-        graph_links = []
-        for _, row in transactions_df.iterrows():
-            graph_links.append({
-                "source": int(row['sender_id']),
-                "target": int(row['receiver_id']),
-                "amount": round(row['amount'], 2),
-                "is_fraud": int(row['is_fraud_transaction']),
-                "time_step": int(row.get('time_step', 0)),
-                "timestamp": str(row.get('timestamp', '')),
-                "transaction_type": row.get('transaction_type', 'normal')
-            })
-            
-        return {
+                "is_in_ring": is_in_ring,
+                "features": dict(zip(feature_cols, features))
+            }
+            for node_id, is_fraud, is_in_ring, features in zip(
+                node_ids.tolist(),
+                nodes_df['is_fraud'].to_numpy(np.int64).tolist(),
+                ring_mask[node_ids].tolist(),
+                nodes_df[feature_cols].to_numpy(np.float64).tolist()
+            )
+        ]
+        
+        num_links = len(transactions_df)
+        def column_or(col, default):
+            if col not in transactions_df.columns:
+                return [default] * num_links
+            return transactions_df[col].tolist()
+        
+        graph_links = [
+            {
+                "source": source,
+                "target": target,
+                "amount": amount,
+                "is_fraud": is_fraud,
+                "time_step": time_step,
+                "timestamp": timestamp,
+                "transaction_type": transaction_type
+            }
+            for source, target, amount, is_fraud, time_step, timestamp, transaction_type in zip(
+                transactions_df['sender_id'].to_numpy(np.int64).tolist(),
+                transactions_df['receiver_id'].to_numpy(np.int64).tolist(),
+                transactions_df['amount'].to_numpy(np.float64).round(2).tolist(),
+                transactions_df['is_fraud_transaction'].to_numpy(np.int64).tolist(),
+                column_or('time_step', 0),
+                [str(t) for t in column_or('timestamp', '')],
+                column_or('transaction_type', 'normal')
+            )
+        ]
+        
+        # Encode here and return the bytes: a plain dict would first be walked
+        # by FastAPI's jsonable_encoder, which dominates for a payload this size
+        body = orjson.dumps({
             "nodes": graph_nodes,
             "links": graph_links
-        }
+        })
+        return Response(content=body, media_type="application/json")
             
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing graph data: {str(e)}")
@@ -266,7 +498,7 @@ async def api_get_graph_data():
 @app.post("/explain_node/{node_id}")
 async def api_explain_node(node_id: int):
     try:
-        explanation = gnn_model.explain_node_prediction(node_id)
+        explanation = await explain_node(node_id)
         return explanation
     except FileNotFoundError as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -278,16 +510,23 @@ async def api_explain_node(node_id: int):
 @app.post("/generate_investigation_report/{node_id}")
 async def api_generate_investigation_report(node_id: int):
     try:
-        explanation = gnn_model.explain_node_prediction(node_id)
-        nodes_df = pd.read_csv(data_generator.NODES_FILE)
-        transactions_df = pd.read_csv(data_generator.TRANSACTIONS_FILE)
+        # The explanation and the two loads are independent: run them concurrently
+        explanation, nodes_df, node_stats = await asyncio.gather(
+            explain_node(node_id),
+            load_nodes_indexed(),
+            load_node_stats()
+        )
         
-        node_data = nodes_df[nodes_df['node_id'] == node_id].iloc[0].to_dict()
+        node_data = nodes_df.loc[node_id].to_dict()
         
-        related_txns = transactions_df[
-            (transactions_df['sender_id'] == node_id) | 
-            (transactions_df['receiver_id'] == node_id)
-        ]
+        if node_id in node_stats.index:
+            stats = node_stats.loc[node_id]
+            num_txns = int(stats['n_total'])
+            total_volume = float(stats['total_amt'])
+            avg_transaction = float(stats['avg_amt'])
+            fraud_count = int(stats['fraud_count'])
+        else:
+            num_txns, total_volume, avg_transaction, fraud_count = 0, 0.0, float('nan'), 0
         
         prompt = f"""You are a financial fraud investigator. Generate a professional Suspicious Activity Report (SAR) for the following case:
 
@@ -300,10 +539,10 @@ async def api_generate_investigation_report(node_id: int):
 - Suspicious Connected Accounts: {', '.join([f"Node {n['neighbor_id']} (connection strength: {n['importance']:.2%})" for n in explanation['top_neighbors']])}
 
 **TRANSACTION SUMMARY:**
-- Total Transactions: {len(related_txns)}
-- Total Transaction Volume: ${related_txns['amount'].sum():.2f}
-- Average Transaction Size: ${related_txns['amount'].mean():.2f}
-- Fraudulent Transaction Count: {related_txns['is_fraud_transaction'].sum()}
+- Total Transactions: {num_txns}
+- Total Transaction Volume: ${total_volume:.2f}
+- Average Transaction Size: ${avg_transaction:.2f}
+- Fraudulent Transaction Count: {fraud_count}
 
 **BEHAVIORAL INDICATORS:**
 - Feature 0 (Account Age Risk): {node_data.get('feature_0', 0):.4f}
@@ -318,18 +557,19 @@ Generate a professional SAR report with the following sections:
 
 Keep it concise, actionable, and professional. Use financial crime terminology."""
 
+        # Native async call: the request waits on Gemini without holding a thread
         model = genai.GenerativeModel('gemini-2.5-flash')
-        response = model.generate_content(prompt)
+        response = await model.generate_content_async(prompt)
         
         return {
             "node_id": node_id,
             "report": response.text,
             "technical_data": explanation,
             "transaction_stats": {
-                "total_transactions": int(len(related_txns)),
-                "total_volume": float(related_txns['amount'].sum()),
-                "avg_transaction": float(related_txns['amount'].mean()),
-                "fraud_count": int(related_txns['is_fraud_transaction'].sum())
+                "total_transactions": num_txns,
+                "total_volume": total_volume,
+                "avg_transaction": avg_transaction,
+                "fraud_count": fraud_count
             }
         }
         
@@ -340,51 +580,63 @@ Keep it concise, actionable, and professional. Use financial crime terminology."
 async def websocket_realtime_monitor(websocket: WebSocket):
     await manager.connect(websocket)
     try:
-        model, data = gnn_model.load_model_and_data()
-        if model is None or data is None:
+        probabilities = await get_inference_probs()
+        if probabilities is None:
             await websocket.send_json({
                 "type": "error",
                 "message": "Model not trained. Please train the model first."
             })
             return
         
-        transactions_df = pd.read_csv(data_generator.TRANSACTIONS_FILE)
+        transactions_df = await load_transactions()
         transactions_df = transactions_df.sort_values('time_step').reset_index(drop=True)
         
-        import torch
-        with torch.no_grad():
-            out = model(data.x, data.edge_index)
-            probabilities = out.exp().cpu().numpy()
-        
         FRAUD_THRESHOLD = 0.75
         
-        for idx, txn in transactions_df.iterrows():
+        # Compute every transaction's risk scores and alert flag up front with array ops;
+        # the loop below only zips precomputed columns and encodes with orjson
+        senders = transactions_df['sender_id'].to_numpy(np.int64)
+        receivers = transactions_df['receiver_id'].to_numpy(np.int64)
+        sender_probs = probabilities[senders, 1]
+        receiver_probs = probabilities[receivers, 1]
+        is_alert = (sender_probs > FRAUD_THRESHOLD) | (receiver_probs > FRAUD_THRESHOLD)
+        if 'transaction_type' in transactions_df.columns:
+            transaction_types = transactions_df['transaction_type'].tolist()
+        else:
+            transaction_types = ['normal'] * len(transactions_df)
+        
+        columns = zip(
+            transactions_df['timestamp'].astype(str).tolist(),
+            senders.tolist(),
+            receivers.tolist(),
+            transactions_df['amount'].to_numpy(np.float64).tolist(),
+            is_alert.tolist(),
+            sender_probs.tolist(),
+            receiver_probs.tolist(),
+            transactions_df['is_fraud_transaction'].to_numpy(np.int64).tolist(),
+            transaction_types
+        )
+        
+        for idx, (timestamp, sender, receiver, amount, alert, sender_prob, receiver_prob,
+                  fraud_actual, transaction_type) in enumerate(columns):
             await asyncio.sleep(0.05)
             
-            sender = int(txn['sender_id'])
-            receiver = int(txn['receiver_id'])
-            
-            sender_prob = float(probabilities[sender][1])
-            receiver_prob = float(probabilities[receiver][1])
-            
-            is_alert = (sender_prob > FRAUD_THRESHOLD or receiver_prob > FRAUD_THRESHOLD)
-            
             alert_data = {
                 "type": "transaction",
-                "transaction_id": int(idx),
-                "timestamp": str(txn['timestamp']),
+                "transaction_id": idx,
+                "timestamp": timestamp,
                 "sender_id": sender,
                 "receiver_id": receiver,
-                "amount": float(txn['amount']),
-                "is_alert": is_alert,
+                "amount": amount,
+                "is_alert": alert,
                 "sender_risk_score": sender_prob,
                 "receiver_risk_score": receiver_prob,
-                "fraud_actual": int(txn['is_fraud_transaction']),
-                "transaction_type": txn.get('transaction_type', 'normal'),
+                "fraud_actual": fraud_actual,
+                "transaction_type": transaction_type,
                 "threshold": FRAUD_THRESHOLD
             }
             
-            await websocket.send_json(alert_data)
+            await websocket.send_text(orjson.dumps(alert_data).decode())
             
     except WebSocketDisconnect:
         manager.disconnect(websocket)
@@ -397,17 +649,13 @@ async def websocket_realtime_monitor(websocket: WebSocket):
 @app.get("/model_diagnostics")
 async def get_model_diagnostics():
     try:
-        model, data = gnn_model.load_model_and_data()
-        if not model or not data:
+        probabilities = await get_inference_probs()
+        if probabilities is None:
             raise HTTPException(status_code=400, detail="Model not trained")
         
-        import torch
-        with torch.no_grad():
-            out = model(data.x, data.edge_index)
-            predictions = out.argmax(dim=1).cpu().numpy()
-            probabilities = out.exp().cpu().numpy()
+        predictions = probabilities.argmax(axis=1)
         
-        nodes_df = pd.read_csv(data_generator.NODES_FILE)
+        nodes_df = await load_nodes(['is_fraud'])
         actual_fraud = nodes_df['is_fraud'].values
         
         fraud_predictions = np.sum(predictions == 1)
@@ -415,18 +663,20 @@ async def get_model_diagnostics():
         actual_fraud_count = np.sum(actual_fraud == 1)
         
         fraud_probs = probabilities[:, 1]
+        sorted_fraud_probs = app.state.sorted_fraud_probs
         
         thresholds = [0.5, 0.6, 0.7, 0.75, 0.8, 0.9]
         threshold_analysis = {}
         
-        for thresh in thresholds:
-            high_conf_fraud = np.sum(fraud_probs > thresh)
+        # Count of probabilities > t for every t at once via binary search on the sorted array
+        alert_counts = len(sorted_fraud_probs) - np.searchsorted(sorted_fraud_probs, thresholds, side='right')
+        for thresh, high_conf_fraud in zip(thresholds, alert_counts):
             threshold_analysis[str(thresh)] = {
                 "alerts_triggered": int(high_conf_fraud),
                 "percentage_of_total": float(high_conf_fraud / len(predictions) * 100)
             }
         
-        return {
+        body = orjson.dumps({
             "total_nodes": int(len(predictions)),
             "actual_fraud_nodes": int(actual_fraud_count),
             "predicted_fraud_nodes_default": int(fraud_predictions),
@@ -434,11 +684,12 @@ async def get_model_diagnostics():
             "fraud_rate_actual": float(actual_fraud_count / len(predictions) * 100),
             "fraud_rate_predicted": float(fraud_predictions / len(predictions) * 100),
             "avg_fraud_probability": float(np.mean(fraud_probs)),
-            "max_fraud_probability": float(np.max(fraud_probs)),
-            "min_fraud_probability": float(np.min(fraud_probs)),
+            "max_fraud_probability": float(sorted_fraud_probs[-1]),
+            "min_fraud_probability": float(sorted_fraud_probs[0]),
             "threshold_analysis": threshold_analysis,
             "recommendation": "Consider using threshold 0.75 or higher to reduce false positives"
-        }
+        })
+        return Response(content=body, media_type="application/json")
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -451,36 +702,22 @@ class CaseUpdate(BaseModel):
     status: Literal["open", "investigating", "confirmed_fraud", "false_positive"]
     analyst_notes: str
 
-# --- ADD THESE HELPER FUNCTIONS ---
-def load_cases():
-    if not os.path.exists(CASES_FILE):
-        return {}
-    with open(CASES_FILE, 'r') as f:
-        return json.load(f)
-
-def save_cases(cases_data):
-    with open(CASES_FILE, 'w') as f:
-        json.dump(cases_data, f, indent=2)
-
 # --- ADD THESE NEW ENDPOINTS ---
+# Cases live in SQLite (see case_store), one row per case; its calls block, so they run in a worker thread
 
 @app.get("/cases")
 async def get_all_cases():
-    return load_cases()
+    return await asyncio.to_thread(case_store.get_all_cases)
 
 @app.post("/cases/create")
 async def create_case(case: CaseCreate):
-    cases = load_cases()
     case_id = str(case.node_id)
     
-    if case_id in cases:
-        raise HTTPException(status_code=400, detail="Case already exists for this node")
-    
     # Get current node details for context
-    nodes_df = pd.read_csv(data_generator.NODES_FILE)
-    node_info = nodes_df[nodes_df['node_id'] == case.node_id].iloc[0].to_dict()
+    nodes_df = await load_nodes_indexed()
+    node_info = nodes_df.loc[case.node_id].to_dict()
     
-    cases[case_id] = {
+    new_case = {
         "case_id": case_id,
         "node_id": case.node_id,
         "status": "open",
@@ -491,50 +728,34 @@ async def create_case(case: CaseCreate):
         "risk_score": node_info.get('feature_1', 0) # Example placeholder
     }
     
-    save_cases(cases)
+    if not await asyncio.to_thread(case_store.insert_case, new_case):
+        raise HTTPException(status_code=400, detail="Case already exists for this node")
     return {"message": "Case opened", "case_id": case_id}
 
 @app.put("/cases/{case_id}/update")
 async def update_case_status(case_id: str, update: CaseUpdate):
-    cases = load_cases()
-    if case_id not in cases:
+    # Sets the status and logs the change in one transaction
+    node_id = await asyncio.to_thread(
+        case_store.update_case_status, case_id, update.status, str(datetime.now()), update.analyst_notes
+    )
+    if node_id is None:
         raise HTTPException(status_code=404, detail="Case not found")
     
-    previous_status = cases[case_id]['status']
-    cases[case_id]['status'] = update.status
-    
-    # Log the update
-    cases[case_id]['analyst_updates'].append({
-        "timestamp": str(datetime.now()),
-        "from_status": previous_status,
-        "to_status": update.status,
-        "note": update.analyst_notes
-    })
-    
     # === ACTIVE LEARNING HOOK ===
     # If analyst marks as "False Positive" or "Confirmed Fraud", 
-    # we update the ground truth in nodes.csv to improve future training.
+    # we record the new ground truth to improve future training.
+    # Overrides are appended to a log and written into nodes.csv when training starts
     if update.status in ["confirmed_fraud", "false_positive"]:
-        nodes_df = pd.read_csv(data_generator.NODES_FILE)
-        
         # 0 = Legitimate, 1 = Fraud
         new_label = 1 if update.status == "confirmed_fraud" else 0
         
-        # Update the CSV
-        row_idx = nodes_df.index[nodes_df['node_id'] == int(cases[case_id]['node_id'])].tolist()
-        if row_idx:
-            nodes_df.at[row_idx[0], 'is_fraud'] = new_label
-            nodes_df.to_csv(data_generator.NODES_FILE, index=False)
-            print(f"Active Learning: Node {case_id} label updated to {new_label}")
+        await asyncio.to_thread(data_generator.append_label_override, node_id, new_label)
+        print(f"Active Learning: Node {case_id} label override recorded as {new_label}")
 
-    save_cases(cases)
     return {"message": "Case updated", "new_status": update.status}
 @app.delete("/cases/{case_id}")
 async def delete_case(case_id: str):
-    cases = load_cases()
-    if case_id in cases:
-        del cases[case_id]
-        save_cases(cases)
+    if await asyncio.to_thread(case_store.delete_case, case_id):
         return {"message": "Case deleted successfully"}
     else:
         raise HTTPException(status_code=404, detail="Case not found")
@@ -548,11 +769,10 @@ async def verify_identity(node_id: int):
     # 1. GET THE GROUND TRUTH FROM YOUR DATASET
     # We look up the node in the CSV to see if it's actually fraud
     try:
-        nodes_df = pd.read_csv(data_generator.NODES_FILE)
-        node_row = nodes_df[nodes_df['node_id'] == node_id]
+        nodes_df = await load_nodes_indexed(['node_id', 'is_fraud'])
         
-        if not node_row.empty:
-            is_actual_fraud = int(node_row.iloc[0]['is_fraud']) == 1
+        if node_id in nodes_df.index:
+            is_actual_fraud = int(nodes_df.at[node_id, 'is_fraud']) == 1
         else:
             is_actual_fraud = False
     except Exception as e:
@@ -593,26 +813,30 @@ async def verify_identity(node_id: int):
 class ChatRequest(BaseModel):
     query: str
 
+# Matches node references like "Node 456", "User 456", "id 456", "account #456"
+_NODE_RE = re.compile(r'(?:node|user|id|account)\s*#?(\d+)', re.IGNORECASE)
+
 @app.post("/api/copilot")
 async def copilot_chat(request: ChatRequest):
     try:
-        # 1. SETUP: Load Data Frames
+        # 1. SETUP: Load the precomputed node profiles and transaction stats
         if not os.path.exists(data_generator.NODES_FILE):
              return {"type": "text", "text": "Error: Dataset not generated yet."}
              
-        nodes_df = pd.read_csv(data_generator.NODES_FILE)
-        transactions_df = pd.read_csv(data_generator.TRANSACTIONS_FILE)
-        
-        # Load Predictions if available
+        # Load everything concurrently, predictions only if available
         predictions = {}
         if os.path.exists(PREDICTIONS_FILE):
-            with open(PREDICTIONS_FILE, 'r') as f:
-                predictions = json.load(f).get('predictions', [])
+            (node_profiles, num_fraud), node_stats, predictions_data = await asyncio.gather(
+                load_node_profiles(), load_node_stats(), load_predictions()
+            )
+            predictions = predictions_data.get('predictions', [])
+        else:
+            (node_profiles, num_fraud), node_stats = await asyncio.gather(
+                load_node_profiles(), load_node_stats()
+            )
 
         # 2. INTENT DETECTION: Check if user is asking about a specific Node ID
-        import re
-        # Look for patterns like "Node 456", "User 456", "id 456"
-        match = re.search(r'(?:node|user|id|account)\s*#?(\d+)', request.query.lower())
+        match = _NODE_RE.search(request.query)
         
         target_node_id = None
         node_context = ""
@@ -622,42 +846,35 @@ async def copilot_chat(request: ChatRequest):
             
             # 3. DATA RETRIEVAL (The RAG Part)
             # Get the specific row for this node
-            node_row = nodes_df[nodes_df['node_id'] == target_node_id]
-            
-            if not node_row.empty:
-                row_data = node_row.iloc[0]
-                
+            profile = node_profiles.get(target_node_id)
+            if profile is not None:
                 # Get neighbor info
-                outgoing = transactions_df[transactions_df['sender_id'] == target_node_id]
-                incoming = transactions_df[transactions_df['receiver_id'] == target_node_id]
+                num_sent, total_sent, num_received = 0, 0.0, 0
+                if target_node_id in node_stats.index:
+                    stats = node_stats.loc[target_node_id]
+                    num_sent, total_sent, num_received = int(stats['n_out']), float(stats['total_out']), int(stats['n_in'])
                 
                 # Get Prediction info
                 is_fraud_pred = "Unknown"
                 if predictions and target_node_id < len(predictions):
                     is_fraud_pred = "FRAUD" if predictions[target_node_id] == 1 else "SAFE"
                 
-                # Mock up "Real World" data (IP, Location) since it's not in the CSV
-                # We use a hash so it's consistent every time you ask
-                random.seed(target_node_id)
-                fake_ips = [f"192.168.1.{random.randint(10,99)}", f"10.0.5.{random.randint(10,99)}"]
-                fake_cities = ["Lagos, NG", "Moscow, RU", "New York, USA", "London, UK", "Bangalore, IN"]
-                node_location = random.choice(fake_cities)
-                node_ip = random.choice(fake_ips)
+                node_ip, node_location = _fake_identity(target_node_id)
                 
                 # Construct the Context for Gemini
                 node_context = f"""
                 SPECIFIC DATA FOR NODE {target_node_id}:
                 - Model Prediction: {is_fraud_pred}
-                - Actual Label: {'FRAUD' if row_data['is_fraud'] == 1 else 'Legitimate'}
+                - Actual Label: {'FRAUD' if profile['is_fraud'] == 1 else 'Legitimate'}
                 - IP Address: {node_ip}
                 - Geo-Location: {node_location}
                 - Account Features:
-                  * Feature_0 (Account Age Risk): {row_data['feature_0']:.4f}
-                  * Feature_1 (Transaction Velocity): {row_data['feature_1']:.4f}
-                  * Feature_2 (Network Density): {row_data['feature_2']:.4f}
+                  * Feature_0 (Account Age Risk): {profile['feature_0']:.4f}
+                  * Feature_1 (Transaction Velocity): {profile['feature_1']:.4f}
+                  * Feature_2 (Network Density): {profile['feature_2']:.4f}
                 - Transaction Activity:
-                  * Sent: {len(outgoing)} transfers (Total: ${outgoing['amount'].sum():.2f})
-                  * Received: {len(incoming)} transfers
+                  * Sent: {num_sent} transfers (Total: ${total_sent:.2f})
+                  * Received: {num_received} transfers
                 """
             else:
                 node_context = f"User asked about Node {target_node_id}, but it does not exist in the CSV."
@@ -665,8 +882,8 @@ async def copilot_chat(request: ChatRequest):
         # 4. GENERAL CONTEXT (If no specific node asked)
         general_stats = f"""
         DATASET SUMMARY:
-        - Total Nodes: {len(nodes_df)}
-        - Total Fraud Cases: {nodes_df['is_fraud'].sum()}
+        - Total Nodes: {len(node_profiles)}
+        - Total Fraud Cases: {num_fraud}
         - GNN Model Status: Active
         """
 
@@ -690,7 +907,7 @@ async def copilot_chat(request: ChatRequest):
         
         # 6. GENERATE CONTENT
         model = genai.GenerativeModel('gemini-2.5-flash')
-        response = model.generate_content(system_instruction)
+        response = await model.generate_content_async(system_instruction)
         
         return {
             "type": "text",
@@ -703,4 +920,5 @@ async def copilot_chat(request: ChatRequest):
 
 if __name__ == "__main__":
     print("This file is not meant to be run directly.")
-    print("Run from the 'backend' directory using: uvicorn app.main:app --reload --port 8000")
\ No newline at end of file
+    print("Run from the 'backend' directory using: uvicorn app.main:app --reload --port 8000")
+    print("For production, run ./start.sh (one worker per core; set WEB_CONCURRENCY to override)")
\ No newline at end of file
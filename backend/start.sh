@@ -0,0 +1,9 @@
+#!/usr/bin/env sh
+# Production launcher: gunicorn managing Uvicorn workers, one per CPU core by default.
+# Override the worker count with WEB_CONCURRENCY. Each worker keeps its own data,
+# inference and cases caches; they reload when the files on disk change.
+cd "$(dirname "$0")"
+exec gunicorn app.main:app \
+    -k uvicorn.workers.UvicornWorker \
+    -w "${WEB_CONCURRENCY:-$(nproc)}" \
+    --bind 0.0.0.0:8000